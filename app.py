@@ -1,7 +1,13 @@
 # Import required libraries for the Streamlit web application
 import streamlit as st
-from support_agent import SupportAgent
+from support_agent import SupportAgent, AgentResources
+from config import is_cloud_deployment
+import base64
+import hashlib
 import io
+import os
+import shutil
+import tempfile
 import time
 from audio_recorder_streamlit import audio_recorder
 
@@ -11,41 +17,105 @@ st.set_page_config(
     layout="wide"  # Use full width layout for better UI
 )
 
+@st.cache_data
+def _is_cloud() -> bool:
+    """Cache the cloud-environment probe for the process lifetime
+
+    is_cloud_deployment() shells out to check for an audio system on Linux,
+    so don't repeat it on every rerun.
+    """
+    return is_cloud_deployment()
+
+@st.cache_data
+def parse_urls(text: str) -> list:
+    """Parse the URL text area into a list of http(s) URLs (one per line)
+
+    Cached on the raw text so unchanged input isn't re-split and
+    re-stripped on every rerun.
+    """
+    urls = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and stripped.startswith(('http://', 'https://')):
+            urls.append(stripped)
+    return urls
+
+@st.cache_resource
+def get_shared_resources() -> AgentResources:
+    """Build the shared Azure handles once per process
+
+    AgentResources owns the Azure OpenAI and Speech SDK clients (and the
+    knowledge base) whose connection pools and auth handshakes are expensive
+    to rebuild, and all of it is safe to share, so it is cached process-wide.
+    The SupportAgent itself is NOT cached: each browser session builds its
+    own lightweight agent so conversation history, the RAG toggle, and the
+    system prompt stay private to that session.
+    """
+    return AgentResources()
+
 # Initialize session state variables to maintain state across app reruns
 if 'agent' not in st.session_state:
     try:
-        # Create the main SupportAgent instance with Azure AI services
-        st.session_state.agent = SupportAgent()
+        # Per-session agent wrapped around the shared Azure handles
+        st.session_state.agent = SupportAgent(get_shared_resources())
         st.session_state.initialized = True
     except Exception as e:
         # Handle initialization errors (e.g., missing API keys)
         st.session_state.initialized = False
         st.session_state.error = str(e)
 
-# Initialize conversation history to store chat messages
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-
-# Initialize voice recording state variables
-if 'is_recording' not in st.session_state:
-    st.session_state.is_recording = False  # Track if currently recording audio
-
-if 'recognizer' not in st.session_state:
-    st.session_state.recognizer = None  # Store speech recognizer instance
-
-# Initialize additional session state variables for voice recording
-if 'recording_start_time' not in st.session_state:
-    st.session_state.recording_start_time = None  # Track when recording started
-
-if 'user_has_interacted' not in st.session_state:
-    st.session_state.user_has_interacted = False  # Track if user has interacted with the app
+# Initialize remaining session state in one pass with setdefault
+for key, default in (
+    ('messages', []),                 # Conversation history of chat messages
+    ('is_recording', False),          # Track if currently recording audio
+    ('recognizer', None),             # Store speech recognizer instance
+    ('recording_start_time', None),   # Track when recording started
+    ('user_has_interacted', False),   # Track if user has interacted with the app
+):
+    st.session_state.setdefault(key, default)
+
+@st.cache_data
+def cached_rag_stats(kb_version: int):
+    """Memoize knowledge base statistics keyed on the KB version counter
+
+    Every rerun (including the 0.3s timer ticks while recording) renders the
+    knowledge base info box, so only hit the RAG system again after the
+    knowledge base has actually been rebuilt or cleared. The counter lives
+    on the shared AgentResources (the KB is process-wide), so a rebuild in
+    any session refreshes the stats for all of them.
+    """
+    return st.session_state.agent.get_rag_stats()
+
+def audio_spill_dir() -> str:
+    """This session's directory for spilled audio, created on first use
+
+    Keeping the spilled WAV files in one managed directory (instead of
+    anonymous temp files) lets Reset Conversation reclaim them all at once.
+    """
+    if 'audio_spill_dir' not in st.session_state:
+        st.session_state.audio_spill_dir = tempfile.mkdtemp(prefix="support_agent_audio_")
+    return st.session_state.audio_spill_dir
+
+def discard_spilled_audio():
+    """Delete this session's spilled audio files (see archive_old_audio)
+
+    Resetting the conversation drops the messages that hold the only
+    references to the spilled paths, so without this the files would
+    accumulate in the temp dir for the life of the server.
+    """
+    spill_dir = st.session_state.pop('audio_spill_dir', None)
+    if spill_dir:
+        shutil.rmtree(spill_dir, ignore_errors=True)
 
 # Main UI Layout - Create the primary interface
 st.title("Support Agent")  # Main page title
 st.markdown("---")  # Horizontal divider for visual separation
 
-# Sidebar Configuration Panel - Contains all settings and controls
-with st.sidebar:
+# Sidebar Configuration Panel - Contains all settings and controls.
+# Rendered as a fragment so chat submissions and recording ticks don't
+# rebuild the uploader/text-area widget tree on every rerun.
+@st.fragment
+def render_sidebar():
     st.header("Configuration")  # Sidebar header
 
     # RAG (Retrieval-Augmented Generation) System Configuration Section
@@ -58,8 +128,8 @@ with st.sidebar:
         help="Enable retrieval-augmented generation for better responses"
     )
     
-    # Apply RAG setting to the agent if initialized
-    if st.session_state.initialized:
+    # Apply RAG setting to the agent only when the toggle actually changed
+    if st.session_state.initialized and rag_enabled != st.session_state.agent.use_rag:
         st.session_state.agent.enable_rag(rag_enabled)
     
     # Document Upload Section - Allow users to add knowledge sources
@@ -93,9 +163,7 @@ with st.sidebar:
             help="Enable for JavaScript-heavy sites (slower but more complete content). Note: May not work in cloud environments - will fallback to standard method."
         )
         
-        urls = []
-        if url_input:
-            urls = [url.strip() for url in url_input.split('\n') if url.strip() and url.strip().startswith(('http://', 'https://'))]
+        urls = parse_urls(url_input) if url_input else []
     
     # Show build button if there are files or URLs
     has_files = uploaded_files is not None and len(uploaded_files) > 0
@@ -103,45 +171,29 @@ with st.sidebar:
     
     if (has_files or has_urls) and st.button("📚 Build Knowledge Base"):
         if st.session_state.initialized:
-            # Combine files and URLs
-            all_inputs = []
-            
-            # Handle uploaded files
-            if has_files:
-                file_paths = []
-                for uploaded_file in uploaded_files:
-                    # Create a temporary file
-                    with open(f"temp_{uploaded_file.name}", "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    file_paths.append(f"temp_{uploaded_file.name}")
-                all_inputs.extend(file_paths)
-            
-            # Handle URLs
+            # Hand uploads to the agent straight from memory — no temp-file
+            # write/re-read/delete round-trip through the working directory
+            files = [(f.name, f.getvalue()) for f in uploaded_files] if has_files else []
+
             if has_urls:
-                all_inputs.extend(urls)
                 st.info(f"🌐 Processing {len(urls)} URL(s)...")
-            
+
             # Setup knowledge base
             with st.spinner("Building knowledge base..."):
-                success, message = st.session_state.agent.setup_rag_knowledge_base(all_inputs, use_js_rendering=use_js_rendering)
+                success, message = st.session_state.agent.setup_rag_knowledge_base_streams(
+                    files, urls=urls, use_js_rendering=use_js_rendering
+                )
                 if success:
                     st.success(message)
                     st.session_state.agent.enable_rag(True)
                 else:
                     st.error(message)
-            
-            # Clean up temporary files
-            import os
-            if has_files:
-                for file_path in file_paths:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
     
     # Knowledge base management
     if st.session_state.initialized:
-        rag_stats = st.session_state.agent.get_rag_stats()
+        rag_stats = cached_rag_stats(st.session_state.agent.kb_version)
         st.info(f"📊 Knowledge Base: {rag_stats['total_documents']} documents")
-        
+
         if st.button("🗑️ Clear Knowledge Base"):
             st.session_state.agent.clear_rag_knowledge_base()
             st.success("Knowledge base cleared!")
@@ -169,6 +221,7 @@ with st.sidebar:
     if st.button("🔄 Reset Conversation"):
         if st.session_state.initialized:
             st.session_state.agent.reset_conversation()
+            discard_spilled_audio()  # Reclaim audio spilled to disk
             st.session_state.messages = []
             st.success("Conversation reset!")
             st.rerun()
@@ -179,6 +232,9 @@ with st.sidebar:
     st.subheader("Statistics")
     st.metric("Messages", len(st.session_state.messages))
 
+with st.sidebar:
+    render_sidebar()
+
 # Check if agent is initialized
 if not st.session_state.initialized:
     st.error("❌ Failed to initialize AI Support Agent")
@@ -189,26 +245,64 @@ if not st.session_state.initialized:
 # Main content area
 col1, col2 = st.columns([2, 1])
 
+def archive_old_audio():
+    """Spill audio of older messages to disk, keeping only the newest few in RAM
+
+    Raw WAV blobs accumulate at ~hundreds of KB per assistant turn and would
+    otherwise be retained in session state for the whole conversation. Older
+    audio is moved into the session's spill directory and lazy-loaded on
+    replay; Reset Conversation deletes the directory (discard_spilled_audio).
+    """
+    for msg in st.session_state.messages[:-3]:
+        if msg.get("audio_data"):
+            fd, path = tempfile.mkstemp(suffix=".wav", dir=audio_spill_dir())
+            with os.fdopen(fd, "wb") as f:
+                f.write(msg["audio_data"])
+            msg["audio_path"] = path
+            msg["audio_data"] = None
+            msg.pop("audio_b64", None)
+
 with col1:
     st.subheader("Conversation")
 
-    # Display conversation history
-    for msg in st.session_state.messages:
+    # Move audio from older turns out of session state before rendering
+    archive_old_audio()
+
+    # Display conversation history — render only the newest messages as full
+    # chat bubbles and collapse older ones into an expander, so per-rerun
+    # render cost stays bounded however long the conversation gets
+    RENDER_TAIL = 20
+    older_messages = st.session_state.messages[:-RENDER_TAIL]
+    recent_messages = st.session_state.messages[-RENDER_TAIL:]
+
+    if older_messages:
+        with st.expander(f"Earlier messages ({len(older_messages)})"):
+            for msg in older_messages:
+                st.markdown(f"**{msg['role'].capitalize()}** ({msg.get('timestamp', 'N/A')}): {msg['content']}")
+
+    for msg in recent_messages:
         with st.chat_message(msg["role"]):
             st.write(msg["content"])
             if msg.get("timestamp"):
                 st.caption(msg["timestamp"])
             # Display audio player for assistant messages with audio
-            if msg["role"] == "assistant" and msg.get("audio_data"):
-                # Create a unique key for each audio player
-                audio_key = f"audio_{hash(msg['content'])}"
+            if msg["role"] == "assistant" and (msg.get("audio_data") or msg.get("audio_path")):
+                # Create a unique key for each audio player, computed once per
+                # message with a stable digest instead of re-hashing the full
+                # content via salted hash() on every rerun
+                if "audio_key" not in msg:
+                    msg["audio_key"] = "audio_" + hashlib.blake2b(
+                        msg["content"].encode(), digest_size=8
+                    ).hexdigest()
+                audio_key = msg["audio_key"]
                 
                 # For the most recent message, add auto-play functionality
                 if msg == st.session_state.messages[-1]:
-                    # Create a data URL for the audio
-                    import base64
-                    audio_b64 = base64.b64encode(msg["audio_data"]).decode()
-                    audio_data_url = f"data:audio/wav;base64,{audio_b64}"
+                    # Reuse the base64 string computed once when the message
+                    # was appended instead of re-encoding on every rerun
+                    if "audio_b64" not in msg:
+                        msg["audio_b64"] = base64.b64encode(msg["audio_data"]).decode()
+                    audio_data_url = f"data:audio/wav;base64,{msg['audio_b64']}"
                     
                     st.markdown("🔊 **Auto-playing response...** (Click to replay if needed)")
                     
@@ -219,8 +313,15 @@ with col1:
                         Your browser does not support the audio element.
                     </audio>
                     """, unsafe_allow_html=True)
-                else:
+                elif msg.get("audio_data"):
                     st.audio(msg["audio_data"], format="audio/wav")
+                else:
+                    # Older turn: audio was spilled to disk, lazy-load it
+                    try:
+                        with open(msg["audio_path"], "rb") as f:
+                            st.audio(f.read(), format="audio/wav")
+                    except OSError:
+                        st.caption("🔇 Audio no longer available")
 
     # Chat input
     user_input = st.chat_input("Type your message here...")
@@ -245,29 +346,40 @@ with col1:
         # Generate and display AI response
         with st.spinner("Thinking..."):
             try:
-                response = st.session_state.agent.generate_response(user_input)
-
-                # Text-to-speech
-                with st.spinner("Generating speech..."):
-                    audio_data = st.session_state.agent.text_to_speech(response)
+                # Stream the LLM response and synthesize speech sentence by
+                # sentence in parallel, instead of waiting for the full
+                # response before starting TTS
+                response, audio_data = st.session_state.agent.generate_response_with_speech(user_input)
 
-                # Add assistant message with audio data
+                # Add assistant message with audio data, encoding the audio to
+                # base64 once so reruns never have to re-encode it
                 response_timestamp = time.strftime("%H:%M:%S")
+                audio_b64 = base64.b64encode(audio_data).decode() if audio_data else ""
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": response,
                     "timestamp": response_timestamp,
-                    "audio_data": audio_data
+                    "audio_data": audio_data,
+                    "audio_b64": audio_b64
                 })
 
                 # Display assistant message
                 with st.chat_message("assistant"):
                     st.write(response)
                     st.caption(response_timestamp)
-                    # Audio will be displayed by the conversation history loop with auto-play
-
-                # Rerun to trigger conversation history loop and show audio
-                st.rerun()
+                    # Render the auto-play audio inline instead of rerunning the
+                    # whole script just so the history loop can pick it up —
+                    # avoids re-rendering every past message on each turn
+                    if audio_data:
+                        audio_data_url = f"data:audio/wav;base64,{audio_b64}"
+
+                        st.markdown("🔊 **Auto-playing response...** (Click to replay if needed)")
+                        st.markdown(f"""
+                        <audio controls autoplay style="width: 100%; margin: 5px 0;">
+                            <source src="{audio_data_url}" type="audio/wav">
+                            Your browser does not support the audio element.
+                        </audio>
+                        """, unsafe_allow_html=True)
 
             except Exception as e:
                 st.error(f"Error: {str(e)}")
@@ -275,9 +387,8 @@ with col1:
 with col2:
     st.subheader("Voice Input")
     
-    # Check if running on cloud
-    from config import is_cloud_deployment
-    is_cloud = is_cloud_deployment()
+    # Check if running on cloud (cached — the probe shells out on Linux)
+    is_cloud = _is_cloud()
 
     # Voice input method selection
     if is_cloud:
@@ -310,17 +421,30 @@ with col2:
         with btn_col2:
             stop_button = st.button("⏹️ Stop Recording", type="secondary", disabled=not st.session_state.is_recording)
         
-        # Show recording status with timer and real-time transcription
-        if st.session_state.is_recording and st.session_state.recording_start_time:
+        # Show recording status with timer and real-time transcription.
+        # The fragment reruns only this block every 0.3s while recording,
+        # instead of busy-waiting with time.sleep + st.rerun() over the
+        # whole app (sidebar, history loop, widgets) ~3x per second.
+        @st.fragment(run_every=0.3 if st.session_state.is_recording else None)
+        def recording_status():
+            if not (st.session_state.is_recording and st.session_state.recording_start_time):
+                return
+
             elapsed = int(time.time() - st.session_state.recording_start_time)
             st.warning(f"🔴 Recording in progress... ({elapsed}s) - Speak now or click Stop!")
-            
+
             # Show real-time transcription
             current_text = st.session_state.agent.get_current_transcription()
             if current_text:
                 st.info(f"🎤 **Live transcription:** {current_text}")
             else:
                 st.info("🎤 **Listening...** (speech will appear here as you talk)")
+
+            # Hand control back to the main script for auto-stop processing
+            if time.time() - st.session_state.recording_start_time > 10:
+                st.rerun(scope="app")
+
+        recording_status()
         
         # Handle Start Recording
         if start_button and not st.session_state.is_recording:
@@ -358,20 +482,18 @@ with col2:
                         "timestamp": timestamp
                     })
 
-                    # Generate response
+                    # Generate response and speech concurrently: sentences
+                    # are synthesized while later tokens are still streaming
                     with st.spinner("🤔 Generating response..."):
-                        response = st.session_state.agent.generate_response(recognized_text)
-
-                    # Generate speech
-                    with st.spinner("🔊 Generating speech..."):
-                        audio_data = st.session_state.agent.text_to_speech(response)
+                        response, audio_data = st.session_state.agent.generate_response_with_speech(recognized_text)
 
                     response_timestamp = time.strftime("%H:%M:%S")
                     st.session_state.messages.append({
                         "role": "assistant",
                         "content": response,
                         "timestamp": response_timestamp,
-                        "audio_data": audio_data  # Store audio data with the message
+                        "audio_data": audio_data,  # Store audio data with the message
+                        "audio_b64": base64.b64encode(audio_data).decode() if audio_data else ""
                     })
 
                     st.rerun()
@@ -410,13 +532,10 @@ with col2:
                             "timestamp": timestamp
                         })
 
-                        # Generate response
+                        # Generate response and speech concurrently: sentences
+                        # are synthesized while later tokens are still streaming
                         with st.spinner("🤔 Generating response..."):
-                            response = st.session_state.agent.generate_response(recognized_text)
-
-                        # Generate speech
-                        with st.spinner("🔊 Generating speech..."):
-                            audio_data = st.session_state.agent.text_to_speech(response)
+                            response, audio_data = st.session_state.agent.generate_response_with_speech(recognized_text)
 
                         response_timestamp = time.strftime("%H:%M:%S")
                         st.session_state.messages.append({
@@ -436,10 +555,6 @@ with col2:
                     st.session_state.recording_start_time = None
                     st.error(f"❌ Error: {str(e)}")
                     st.rerun()
-            else:
-                # Keep updating to show timer and real-time transcription
-                time.sleep(0.3)  # Faster updates for real-time feel
-                st.rerun()
 
     st.markdown("---")
 
@@ -447,15 +562,14 @@ with col2:
     st.subheader("Export")
     if st.button("📥 Export Conversation"):
         if st.session_state.messages:
-            # Create text export
-            export_text = "AI Support Agent Conversation\n"
-            export_text += "=" * 50 + "\n\n"
-
-            for msg in st.session_state.messages:
-                role = msg['role'].upper()
-                content = msg['content']
-                timestamp = msg.get('timestamp', 'N/A')
-                export_text += f"[{timestamp}] {role}:\n{content}\n\n"
+            # Create text export by joining parts once instead of repeatedly
+            # concatenating strings (O(N^2) for long conversations)
+            parts = ["AI Support Agent Conversation", "=" * 50, ""]
+            parts.extend(
+                f"[{msg.get('timestamp', 'N/A')}] {msg['role'].upper()}:\n{msg['content']}\n"
+                for msg in st.session_state.messages
+            )
+            export_text = "\n".join(parts)
 
             # Offer download
             st.download_button(
@@ -1,6 +1,8 @@
 # Configuration management for Azure AI services
+import functools  # Memoization of configuration lookups
 import os  # Environment variable access
 import platform  # Platform detection for OS-specific configurations
+import shutil  # PATH lookups without spawning a subprocess
 from dotenv import load_dotenv  # Load environment variables from .env file
 
 # Load environment variables from .env file (for local development)
@@ -13,12 +15,14 @@ try:
 except ImportError:
     HAS_STREAMLIT = False  # Streamlit not available (command-line usage)
 
+@functools.lru_cache(maxsize=None)
 def get_config_value(key: str, default=None):
     """Get configuration value from Streamlit secrets or environment variables
-    
+
     This function provides a unified way to access configuration values,
     trying Streamlit secrets first (for cloud deployment) and falling back
-    to environment variables (for local development).
+    to environment variables (for local development). Results are memoized —
+    secrets and environment variables don't change within a process.
     """
     if HAS_STREAMLIT:
         try:
@@ -29,24 +33,22 @@ def get_config_value(key: str, default=None):
             return os.getenv(key, default)
     return os.getenv(key, default)  # Direct environment variable access
 
+@functools.lru_cache(maxsize=1)
 def is_cloud_deployment():
     """Detect if running on Streamlit Cloud or other cloud platforms
-    
+
     This function checks for environment indicators that suggest
     the application is running in a cloud environment rather than locally.
+    The result is memoized — the deployment environment can't change while
+    the process is running.
     """
     # Check for Streamlit Cloud environment indicators
     if os.getenv("STREAMLIT_SHARING_MODE"):
         return True
-    # Check if running on Linux without audio system (typical for cloud)
+    # Check if running on Linux without audio system (typical for cloud);
+    # shutil.which is a pure-Python PATH lookup, no subprocess fork needed
     if platform.system() == "Linux":
-        # Check if ALSA/audio libraries are available
-        try:
-            import subprocess
-            result = subprocess.run(['which', 'aplay'], capture_output=True)
-            return result.returncode != 0  # No audio system found
-        except:
-            return True  # Assume cloud if we can't check
+        return shutil.which("aplay") is None  # No audio system found
     return False
 
 class AzureConfig:
@@ -5,26 +5,76 @@ Uses direct text matching instead of vector embeddings for document retrieval
 """
 
 # Standard library imports
+import hashlib  # Content hashing for ingest deduplication
+import heapq  # Top-k selection without sorting all scored chunks
+import math  # IDF computation for BM25 scoring
 import os  # File system operations
 import re  # Regular expressions for text processing
-from typing import List, Dict, Any, Optional  # Type hints for better code documentation
+import shelve  # On-disk cache of scraped URL content
+import time  # Day bucketing for URL ingest hashes
+from array import array  # Compact machine-typed storage for index postings
+from collections import Counter, OrderedDict  # Term frequencies for BM25 indexing; LRU answer cache
+from typing import List, Dict, Any, Optional, Tuple  # Type hints for better code documentation
+from io import BytesIO  # In-memory buffers for uploaded file parsing
 from pathlib import Path  # Cross-platform path handling
-import time  # For timing operations and delays
+from concurrent.futures import ThreadPoolExecutor  # Parallel document loading
+from threading import Lock, RLock  # Serializes the shared browser driver and KB builds
 
 # Third-party imports for web scraping and document processing
 import streamlit as st  # Streamlit UI framework
 import requests  # HTTP requests for web scraping
-from bs4 import BeautifulSoup  # HTML parsing and content extraction
-from urllib.parse import urlparse  # URL parsing and validation
+from requests.adapters import HTTPAdapter  # Connection pooling for the scraper session
+from urllib3.util.retry import Retry  # Bounded retry policy for flaky pages
+from bs4 import BeautifulSoup, FeatureNotFound  # HTML parsing and content extraction
 
 # Azure and LangChain imports for AI integration
 from config import AzureConfig  # Azure service configuration
-from langchain_openai import AzureChatOpenAI  # Azure OpenAI integration
 from langchain_core.documents import Document  # Document schema for LangChain
+# Note: langchain_openai is imported lazily in create_knowledge_base — it is
+# only needed for the standalone fallback LLM, not the shared-client path
 
-# Document processing libraries (avoiding Windows compatibility issues)
-import PyPDF2  # PDF file processing
-from docx import Document as DocxDocument  # Word document processing
+# Note: the document parsers (PyPDF2, python-docx) are imported lazily in
+# the loaders that need them — they are heavyweight packages that would
+# otherwise be paid at app startup even when no files are ever ingested
+
+# Compiled tokenizer for overlap scoring, shared by ingest and query paths
+_WORD_RE = re.compile(r'\w+')
+
+# Common English words that carry no retrieval signal. Dropping them keeps
+# their (huge) postings lists out of the index and off the query path.
+_STOPWORDS = frozenset("""
+    a an and are as at be but by for from had has have i if in into is it
+    its of on or our so that the their this to was we were what when where
+    which who will with you your
+""".split())
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase and tokenize text, dropping stopwords
+
+    The single tokenizer used by both indexing and querying — the two
+    sides must agree or index lookups silently miss.
+    """
+    return [t for t in _WORD_RE.findall(text.lower()) if t not in _STOPWORDS]
+# Whitespace-run collapser for scraped page text
+_WS_RE = re.compile(r'\s+')
+# Paragraph boundary: blank line, tolerating stray spaces/tabs on it
+_PARA_RE = re.compile(r'\n\s*\n')
+# URL shape check: a scheme, then ://, then a non-empty host part
+_URL_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9+\-.]*://[^/\s]+')
+# Tell-tale text left behind when a page requires JavaScript to render
+_JS_MARKER_RE = re.compile(r'enable JavaScript', re.IGNORECASE)
+
+def _make_soup(markup) -> BeautifulSoup:
+    """Parse HTML with the fast lxml parser, falling back to the stdlib one
+
+    lxml is already a project dependency and parses large pages several
+    times faster than html.parser, but the pure-Python parser keeps the
+    scraper working if lxml is missing from the environment.
+    """
+    try:
+        return BeautifulSoup(markup, 'lxml')
+    except FeatureNotFound:
+        return BeautifulSoup(markup, 'html.parser')
 
 class SimpleRAGSystem:
     """Simple RAG system using text matching instead of embeddings
@@ -33,12 +83,111 @@ class SimpleRAGSystem:
     by using direct text matching and keyword overlap scoring for document retrieval.
     """
     
-    def __init__(self):
+    def __init__(self, openai_client=None):
         # Core data storage
         self.documents = []  # List of processed document chunks
-        self.llm = None      # Language model instance (not used in simple mode)
+        self._doc_lens = array('i')  # Token count per chunk, parallel to self.documents
+        # Inverted index: token -> flat int array of interleaved
+        # (chunk id, term frequency) pairs. Typed arrays hold the postings
+        # as raw machine ints instead of per-entry tuple and int objects.
+        self._index = {}
+        self._chunk_hashes = set()  # Digests of indexed chunk texts, for dedupe
+        self.indexed_hashes = set()  # Content hashes of already-ingested sources
+        # One knowledge-base mutation at a time: the RAG system is shared
+        # process-wide, and two concurrent builds would hand the same doc id
+        # to different chunks, leaving postings that point at the wrong
+        # document. Re-entrant so the agent can hold it across a whole
+        # build while these methods still take it for standalone callers.
+        self.build_lock = RLock()
+        # Shared Azure OpenAI client injected by the agent, so chat and RAG
+        # reuse one long-lived connection pool instead of two separate clients
+        self.openai_client = openai_client
+        self.llm = None      # LangChain fallback LLM for standalone use
         self.qa_chain = None # Question-answering chain (not used in simple mode)
+
+        # Pooled HTTP session: keeps TCP/TLS connections alive across URL
+        # loads instead of handshaking per request; the pool is sized for
+        # the parallel ingest workers.
+        self._http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            # A couple of quick retries ride out transient failures without
+            # stalling the whole parallel batch behind one flaky page
+            max_retries=Retry(total=2, backoff_factor=0.2),
+        )
+        self._http.mount('http://', adapter)
+        self._http.mount('https://', adapter)
+        # Mimic a real browser so sites don't serve stripped-down pages
+        self._http.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        })
+
+        # Shared headless Chrome driver for JS rendering, created on first
+        # use and reused across URLs; guarded by a lock because WebDriver
+        # sessions are not thread-safe and ingestion runs on worker threads.
+        self._selenium_driver = None
+        self._selenium_lock = Lock()
+
+        # Serializes the shelve-backed URL cache (shelve is not thread-safe
+        # and ingestion runs on worker threads)
+        self._url_cache_lock = Lock()
+
+        # Status messages produced on ingest worker threads. Streamlit
+        # silently drops st.* calls made off the script thread (no
+        # ScriptRunContext), so the loaders queue their warnings here and
+        # the parallel entry points replay them on the main thread.
+        self._pending_messages: List[Tuple[str, str]] = []
+        self._pending_messages_lock = Lock()
+
+        # LRU cache of synthesized answers keyed by normalized question;
+        # invalidated whenever the knowledge base changes
+        self._answer_cache = OrderedDict()
+
+        # LRU cache of retrieved context strings for the agent's prompt
+        # path (retrieve_context), invalidated together with the answers
+        self._context_cache = OrderedDict()
+
+    def compute_source_hash(self, input_path: str) -> Optional[str]:
+        """Compute a stable content hash for a file or URL source
+
+        Files are hashed by content (streamed in 1 MiB blocks); URLs by
+        their normalized address plus the current day. Returns None when
+        the source cannot be read.
+        """
+        if self.is_url(input_path):
+            # The day bucket makes a URL's hash roll over daily, so changed
+            # remote content is re-ingested on the next day's rebuild. The
+            # re-fetch is cheap: the URL cache revalidates with a
+            # conditional request and unchanged pages come back as a 304.
+            day = time.strftime('%Y-%m-%d')
+            return hashlib.sha256(f"{input_path.strip().lower()}|{day}".encode()).hexdigest()
+        try:
+            file_hash = hashlib.sha256()
+            with open(input_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    file_hash.update(block)
+            return file_hash.hexdigest()
+        except OSError:
+            return None
         
+    def _queue_message(self, level: str, text: str):
+        """Record a status message for replay on the main thread
+
+        The loaders run on ingest worker threads, where st.warning/st.error
+        are silent no-ops, so they queue their messages instead of showing
+        them directly; see _flush_messages.
+        """
+        with self._pending_messages_lock:
+            self._pending_messages.append((level, text))
+
+    def _flush_messages(self):
+        """Show queued loader messages; must run on the Streamlit thread"""
+        with self._pending_messages_lock:
+            pending, self._pending_messages = self._pending_messages, []
+        for level, text in pending:
+            getattr(st, level)(text)
+
     def load_text_file(self, file_path: str) -> List[Document]:
         """Load text file"""
         try:
@@ -46,37 +195,158 @@ class SimpleRAGSystem:
                 content = f.read()
             return [Document(page_content=content, metadata={"source": file_path})]
         except Exception as e:
-            st.error(f"Error loading text file {file_path}: {str(e)}")
+            self._queue_message("error", f"Error loading text file {file_path}: {str(e)}")
             return []
     
+    def _extract_pdf_pages(self, data: bytes) -> List[str]:
+        """Extract the text of every page of a PDF given its raw bytes
+
+        Prefers PyMuPDF, whose native extractor is several times faster
+        than PyPDF2's pure-Python one. When it is unavailable, falls back
+        to PyPDF2 with pages extracted in parallel across contiguous
+        strided ranges; each worker opens its own PdfReader over the
+        shared bytes because readers seek on their underlying stream and
+        are not thread-safe.
+        """
+        try:
+            import fitz  # PyMuPDF; deferred like the other parsers
+        except ImportError:
+            fitz = None
+
+        if fitz is not None:
+            with fitz.open(stream=data, filetype="pdf") as pdf:
+                return [page.get_text("text") or "" for page in pdf]
+
+        import PyPDF2  # Deferred: only loaded once a PDF is actually ingested
+
+        num_pages = len(PyPDF2.PdfReader(BytesIO(data)).pages)
+        if num_pages <= 1:
+            reader = PyPDF2.PdfReader(BytesIO(data))
+            return [page.extract_text() or "" for page in reader.pages]
+
+        max_workers = min(8, num_pages)
+
+        def extract_stride(worker_index: int):
+            reader = PyPDF2.PdfReader(BytesIO(data))
+            return [
+                (page_num, reader.pages[page_num].extract_text() or "")
+                for page_num in range(worker_index, num_pages, max_workers)
+            ]
+
+        texts = [""] * num_pages
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for results in executor.map(extract_stride, range(max_workers)):
+                for page_num, text in results:
+                    texts[page_num] = text
+        return texts
+
+    def _pdf_documents(self, data: bytes, source: str) -> List[Document]:
+        """Build per-page Documents from raw PDF bytes, skipping empty pages"""
+        return [
+            Document(page_content=content, metadata={"source": source, "page": page_num})
+            for page_num, content in enumerate(self._extract_pdf_pages(data))
+            if content.strip()
+        ]
+
     def load_pdf_file(self, file_path: str) -> List[Document]:
-        """Load PDF file"""
+        """Load PDF file with page-parallel text extraction"""
         try:
-            documents = []
             with open(file_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page_num, page in enumerate(pdf_reader.pages):
-                    content = page.extract_text()
-                    if content.strip():
-                        documents.append(Document(
-                            page_content=content,
-                            metadata={"source": file_path, "page": page_num}
-                        ))
-            return documents
+                data = f.read()
+            return self._pdf_documents(data, file_path)
         except Exception as e:
-            st.error(f"Error loading PDF file {file_path}: {str(e)}")
+            self._queue_message("error", f"Error loading PDF file {file_path}: {str(e)}")
             return []
     
     def load_docx_file(self, file_path: str) -> List[Document]:
         """Load DOCX file"""
         try:
+            from docx import Document as DocxDocument  # Deferred: heavyweight parser
+
             doc = DocxDocument(file_path)
             content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
             return [Document(page_content=content, metadata={"source": file_path})]
         except Exception as e:
-            st.error(f"Error loading DOCX file {file_path}: {str(e)}")
+            self._queue_message("error", f"Error loading DOCX file {file_path}: {str(e)}")
             return []
     
+    def load_stream(self, name: str, data: bytes, split: bool = False) -> Optional[List[Document]]:
+        """Load one uploaded file directly from its in-memory bytes
+
+        Skips the temp-file round-trip for Streamlit uploads; split=True
+        chunks the document immediately on the worker. Returns None for
+        unsupported file types so the caller can warn about them.
+        """
+        file_extension = Path(name).suffix.lower()
+        try:
+            if file_extension == '.txt':
+                docs = [Document(
+                    page_content=data.decode('utf-8', errors='replace'),
+                    metadata={"source": name}
+                )]
+            elif file_extension == '.pdf':
+                docs = self._pdf_documents(data, name)
+            elif file_extension in ['.docx', '.doc']:
+                from docx import Document as DocxDocument  # Deferred: heavyweight parser
+
+                doc = DocxDocument(BytesIO(data))
+                content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+                docs = [Document(page_content=content, metadata={"source": name})]
+            else:
+                return None
+
+            if split and docs:
+                return [chunk for doc in docs for chunk in self._split_document(doc)]
+            return docs
+        except Exception as e:
+            self._queue_message("error", f"Error loading uploaded file {name}: {str(e)}")
+            return []
+
+    def load_from_streams_by_name(self, files: List[Tuple[str, bytes]],
+                                  split: bool = False) -> List[Tuple[str, List[Document]]]:
+        """Load uploaded buffers in parallel, keeping results grouped per file
+
+        Returns (name, documents) pairs in input order — failed or
+        unsupported files get an empty list — so callers can tell which
+        uploads actually produced content (e.g. to record ingest hashes
+        only for those).
+        """
+        results: List[Tuple[str, List[Document]]] = []
+        if not files:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+            futures = [
+                executor.submit(self.load_stream, name, data, split)
+                for name, data in files
+            ]
+
+            for (name, _), future in zip(files, futures):
+                try:
+                    docs = future.result()
+
+                    if docs is None:
+                        st.warning(f"Unsupported file type: {Path(name).suffix.lower()}")
+                        docs = []
+                    elif docs:
+                        st.success(f"📄 Loaded {len(docs)} documents from file: {name}")
+
+                    results.append((name, docs))
+
+                except Exception as e:
+                    st.error(f"Error loading {name}: {str(e)}")
+                    results.append((name, []))
+
+        # Replay warnings/errors the workers queued while loading
+        self._flush_messages()
+        return results
+
+    def load_from_streams(self, files: List[Tuple[str, bytes]], split: bool = False) -> List[Document]:
+        """Load uploaded files from in-memory buffers, in parallel"""
+        return [doc
+                for _, docs in self.load_from_streams_by_name(files, split)
+                for doc in docs]
+
     def load_url(self, url: str, use_selenium: bool = False) -> List[Document]:
         """Load content from URL with optional JavaScript rendering"""
         try:
@@ -85,228 +355,375 @@ class SimpleRAGSystem:
             else:
                 return self._load_url_with_requests(url)
         except Exception as e:
-            st.error(f"Error loading URL {url}: {str(e)}")
+            self._queue_message("error", f"Error loading URL {url}: {str(e)}")
             return []
     
+    # Shelve file holding previously scraped pages with their validators
+    URL_CACHE_PATH = ".rag_url_cache"
+
+    def _url_cache_get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Fetch a cached page entry, or None if absent or cache unusable"""
+        try:
+            with self._url_cache_lock, shelve.open(self.URL_CACHE_PATH) as cache:
+                return cache.get(url)
+        except Exception:
+            return None  # Read-only or corrupt cache: behave as uncached
+
+    def _url_cache_put(self, url: str, entry: Dict[str, Any]):
+        """Store a scraped page with its validators; failures are non-fatal"""
+        try:
+            with self._url_cache_lock, shelve.open(self.URL_CACHE_PATH) as cache:
+                cache[url] = entry
+        except Exception:
+            pass  # Caching is best-effort; the page was still loaded
+
     def _load_url_with_requests(self, url: str) -> List[Document]:
         """Load content from URL using requests (fast, but no JavaScript)"""
-        # Add headers to mimic a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
+        # Revalidate against the on-disk cache instead of re-downloading:
+        # send the stored ETag / Last-Modified and accept a cheap 304
+        cached = self._url_cache_get(url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self._http.get(url, headers=headers, timeout=10)
+        if response.status_code == 304 and cached:
+            # Page unchanged since last scrape — skip download and parsing
+            return [Document(page_content=cached['content'], metadata=dict(cached['metadata']))]
         response.raise_for_status()
         
         # Parse HTML content
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-        
-        # Extract text content
-        text = soup.get_text()
+        soup = _make_soup(response.content)
         
-        # Clean up whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        content = ' '.join(chunk for chunk in chunks if chunk)
+        # Strip boilerplate elements in one selector pass over the tree
+        for element in soup.select('script, style, nav, footer, header'):
+            element.decompose()
         
+        # Extract text content and collapse whitespace runs in one regex pass
+        content = _WS_RE.sub(' ', soup.get_text(' ')).strip()
+
         # Get page title
         title = soup.title.string if soup.title else url
         
-        # Check if this looks like a JavaScript app
-        is_js_app = any([
-            "You need to enable JavaScript" in content,
-            "enable JavaScript to run this app" in content,
-            len(content.strip()) < 100,
-            soup.find('div', {'id': 'root'}) is not None,
-            soup.find('div', {'id': 'app'}) is not None
-        ])
+        # Check if this looks like a JavaScript app. Ordered cheapest first
+        # and short-circuiting, so the DOM walks for the root/app divs only
+        # run when the text checks haven't already decided.
+        is_js_app = (
+            len(content) < 100
+            or _JS_MARKER_RE.search(content) is not None
+            or soup.find('div', {'id': 'root'}) is not None
+            or soup.find('div', {'id': 'app'}) is not None
+        )
         
         if is_js_app:
-            st.warning(f"⚠️ {url} appears to be a JavaScript application. Content may be limited. Try enabling 'Use JavaScript Rendering' for better results.")
+            self._queue_message("warning", f"⚠️ {url} appears to be a JavaScript application. Content may be limited. Try enabling 'Use JavaScript Rendering' for better results.")
         
-        return [Document(
-            page_content=content,
-            metadata={
-                "source": url, 
-                "type": "url", 
-                "title": title,
-                "status_code": response.status_code,
-                "method": "requests",
-                "is_js_app": is_js_app
-            }
-        )]
+        metadata = {
+            "source": url,
+            "type": "url",
+            "title": title,
+            "status_code": response.status_code,
+            "method": "requests",
+            "is_js_app": is_js_app
+        }
+
+        # Remember the page and its validators so the next build can
+        # revalidate with a conditional request instead of re-downloading
+        self._url_cache_put(url, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content': content,
+            'metadata': metadata,
+        })
+
+        return [Document(page_content=content, metadata=metadata)]
     
+    def _get_selenium_driver(self):
+        """Return the shared headless Chrome driver, creating it on first use
+
+        Browser startup (and the ChromeDriver download on first run) costs
+        seconds per URL, so one driver is kept alive and reused for every
+        JS-rendered page instead of being relaunched per load. Callers must
+        hold self._selenium_lock.
+        """
+        if self._selenium_driver is not None:
+            return self._selenium_driver
+
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+        from selenium.webdriver.chrome.service import Service
+
+        # Check if running in cloud environment (Streamlit Cloud)
+        is_cloud = os.environ.get('STREAMLIT_SERVER_PORT') is not None
+
+        # Setup Chrome options
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")  # Run in background
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-logging")
+        chrome_options.add_argument("--disable-web-security")
+        chrome_options.add_argument("--allow-running-insecure-content")
+        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument("--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+
+        # Additional options for cloud deployment
+        if is_cloud:
+            chrome_options.add_argument("--remote-debugging-port=9222")
+            chrome_options.add_argument("--disable-background-timer-throttling")
+            chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+            chrome_options.add_argument("--disable-renderer-backgrounding")
+            chrome_options.add_argument("--disable-features=TranslateUI")
+            chrome_options.add_argument("--disable-ipc-flooding-protection")
+
+        if is_cloud:
+            # For cloud deployment, try to use system Chrome
+            service = Service()
+        else:
+            # For local development, use ChromeDriverManager
+            service = Service(ChromeDriverManager().install())
+
+        self._selenium_driver = webdriver.Chrome(service=service, options=chrome_options)
+        return self._selenium_driver
+
+    def _close_selenium_driver(self):
+        """Quit and drop the shared browser driver if one is open"""
+        if self._selenium_driver is not None:
+            try:
+                self._selenium_driver.quit()
+            except Exception:
+                pass  # Driver may already be dead; dropping it is enough
+            self._selenium_driver = None
+
     def _load_url_with_selenium(self, url: str) -> List[Document]:
         """Load content from URL using Selenium (slower, but handles JavaScript)"""
         try:
-            from selenium import webdriver
-            from selenium.webdriver.chrome.options import Options
             from selenium.webdriver.common.by import By
             from selenium.webdriver.support.ui import WebDriverWait
             from selenium.webdriver.support import expected_conditions as EC
-            from webdriver_manager.chrome import ChromeDriverManager
-            from selenium.webdriver.chrome.service import Service
-            import os
-            
-            # Check if running in cloud environment (Streamlit Cloud)
-            is_cloud = os.environ.get('STREAMLIT_SERVER_PORT') is not None
-            
-            # Setup Chrome options
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")  # Run in background
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--disable-extensions")
-            chrome_options.add_argument("--disable-logging")
-            chrome_options.add_argument("--disable-web-security")
-            chrome_options.add_argument("--allow-running-insecure-content")
-            chrome_options.add_argument("--window-size=1920,1080")
-            chrome_options.add_argument("--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-            
-            # Additional options for cloud deployment
-            if is_cloud:
-                chrome_options.add_argument("--remote-debugging-port=9222")
-                chrome_options.add_argument("--disable-background-timer-throttling")
-                chrome_options.add_argument("--disable-backgrounding-occluded-windows")
-                chrome_options.add_argument("--disable-renderer-backgrounding")
-                chrome_options.add_argument("--disable-features=TranslateUI")
-                chrome_options.add_argument("--disable-ipc-flooding-protection")
-            
-            # Initialize driver with error handling
-            try:
-                if is_cloud:
-                    # For cloud deployment, try to use system Chrome
-                    service = Service()
-                else:
-                    # For local development, use ChromeDriverManager
-                    service = Service(ChromeDriverManager().install())
-                
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-            except Exception as driver_error:
-                st.warning(f"ChromeDriver initialization failed: {str(driver_error)}")
-                st.info("Falling back to standard HTTP request method...")
-                return self._load_url_with_requests(url)
-            
-            try:
-                # Load the page
-                driver.get(url)
-                
-                # Wait for content to load
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-                
-                # Wait a bit more for JavaScript to render
-                time.sleep(3)
-                
-                # Get page title
-                title = driver.title or url
-                
-                # Get page source after JavaScript execution
-                page_source = driver.page_source
-                soup = BeautifulSoup(page_source, 'html.parser')
-                
-                # Remove script and style elements
-                for script in soup(["script", "style", "nav", "footer", "header"]):
-                    script.decompose()
-                
-                # Extract text content
-                text = soup.get_text()
-                
-                # Clean up whitespace
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                content = ' '.join(chunk for chunk in chunks if chunk)
-                
-                return [Document(
-                    page_content=content,
-                    metadata={
-                        "source": url, 
-                        "type": "url", 
-                        "title": title,
-                        "status_code": 200,
-                        "method": "selenium",
-                        "is_js_app": True
-                    }
-                )]
-                
-            finally:
-                driver.quit()
-                
+
+            with self._selenium_lock:
+                # Initialize (or reuse) the shared driver with error handling
+                try:
+                    driver = self._get_selenium_driver()
+                except Exception as driver_error:
+                    self._queue_message("warning", f"ChromeDriver initialization failed: {str(driver_error)}")
+                    self._queue_message("info", "Falling back to standard HTTP request method...")
+                    return self._load_url_with_requests(url)
+
+                try:
+                    # The driver is reused across URLs; drop cookies so one
+                    # site's session state can't leak into the next load
+                    driver.delete_all_cookies()
+
+                    # Load the page
+                    driver.get(url)
+
+                    # Wait for content to load
+                    WebDriverWait(driver, 10).until(
+                        EC.presence_of_element_located((By.TAG_NAME, "body"))
+                    )
+
+                    # driver.get() already blocks until the load event, but
+                    # SPAs hydrate or fetch their content afterwards — the
+                    # exact pages JS rendering exists for. Poll the rendered
+                    # text until it is non-trivial and stable across two
+                    # polls (bounded at 5 s), so settled pages proceed after
+                    # one confirming poll instead of a fixed 3 s sleep
+                    last_len = -1
+                    deadline = time.time() + 5
+                    while time.time() < deadline:
+                        text_len = driver.execute_script(
+                            'return document.body.innerText.length'
+                        )
+                        if text_len > 100 and text_len == last_len:
+                            break
+                        last_len = text_len
+                        time.sleep(0.25)
+
+                    # Get page title
+                    title = driver.title or url
+
+                    # Get page source after JavaScript execution
+                    page_source = driver.page_source
+                except Exception:
+                    # A wedged session must not poison later loads; drop it
+                    # so the next URL starts a fresh browser
+                    self._close_selenium_driver()
+                    raise
+
+            soup = _make_soup(page_source)
+
+            # Strip boilerplate elements in one selector pass over the tree
+            for element in soup.select('script, style, nav, footer, header'):
+                element.decompose()
+
+            # Extract text content and collapse whitespace runs in one regex pass
+            content = _WS_RE.sub(' ', soup.get_text(' ')).strip()
+
+            return [Document(
+                page_content=content,
+                metadata={
+                    "source": url,
+                    "type": "url",
+                    "title": title,
+                    "status_code": 200,
+                    "method": "selenium",
+                    "is_js_app": True
+                }
+            )]
+
         except ImportError:
-            st.error("Selenium not available. Install with: pip install selenium webdriver-manager")
-            st.info("Falling back to standard HTTP request method...")
+            self._queue_message("error", "Selenium not available. Install with: pip install selenium webdriver-manager")
+            self._queue_message("info", "Falling back to standard HTTP request method...")
             return self._load_url_with_requests(url)
         except Exception as e:
-            st.warning(f"Selenium error loading URL {url}: {str(e)}")
-            st.info("Falling back to standard HTTP request method...")
+            self._queue_message("warning", f"Selenium error loading URL {url}: {str(e)}")
+            self._queue_message("info", "Falling back to standard HTTP request method...")
             return self._load_url_with_requests(url)
     
     def is_url(self, path: str) -> bool:
         """Check if input is a URL"""
-        try:
-            result = urlparse(path)
-            return all([result.scheme, result.netloc])
-        except:
-            return False
+        # One compiled match replaces urlparse plus try/except: the pattern
+        # requires a scheme and a non-empty host, which is exactly what the
+        # old scheme/netloc check verified
+        return _URL_RE.match(path) is not None
     
-    def load_documents(self, inputs: List[str], use_js_rendering: bool = False) -> List[Document]:
-        """Load documents from files or URLs"""
-        documents = []
-        
-        for input_path in inputs:
-            try:
-                if self.is_url(input_path):
-                    # Handle URL
-                    docs = self.load_url(input_path, use_selenium=use_js_rendering)
-                    if docs:
-                        method = "JavaScript rendering" if use_js_rendering else "standard"
-                        st.success(f"🌐 Loaded {len(docs)} documents from URL ({method}): {input_path}")
-                else:
-                    # Handle file (existing logic)
-                    file_extension = Path(input_path).suffix.lower()
-                    if file_extension == '.txt':
-                        docs = self.load_text_file(input_path)
-                    elif file_extension == '.pdf':
-                        docs = self.load_pdf_file(input_path)
-                    elif file_extension in ['.docx', '.doc']:
-                        docs = self.load_docx_file(input_path)
-                    else:
-                        st.warning(f"Unsupported file type: {file_extension}")
-                        continue
-                    
-                    if docs:
-                        st.success(f"📄 Loaded {len(docs)} documents from file: {input_path}")
-                
-                documents.extend(docs)
-                
-            except Exception as e:
-                st.error(f"Error loading {input_path}: {str(e)}")
-                
-        return documents
+    def _load_single_input(self, input_path: str, use_js_rendering: bool = False,
+                           split: bool = False) -> Optional[List[Document]]:
+        """Load one file or URL (safe to run on a worker thread)
+
+        With split=True the document is chunked immediately on the worker, so
+        full-document text never accumulates in an intermediate list. Returns
+        None for unsupported file types so the caller can warn about them.
+        """
+        if self.is_url(input_path):
+            # Handle URL
+            docs = self.load_url(input_path, use_selenium=use_js_rendering)
+        else:
+            # Handle file (existing logic)
+            file_extension = Path(input_path).suffix.lower()
+            if file_extension == '.txt':
+                docs = self.load_text_file(input_path)
+            elif file_extension == '.pdf':
+                docs = self.load_pdf_file(input_path)
+            elif file_extension in ['.docx', '.doc']:
+                docs = self.load_docx_file(input_path)
+            else:
+                return None
+
+        if split and docs:
+            return [chunk for doc in docs for chunk in self._split_document(doc)]
+        return docs
+
+    def load_documents_by_source(self, inputs: List[str], use_js_rendering: bool = False,
+                                 split: bool = False) -> List[Tuple[str, List[Document]]]:
+        """Load files or URLs in parallel, keeping results grouped per source
+
+        Returns (input, documents) pairs in input order — failed or
+        unsupported sources get an empty list — so callers can tell which
+        sources actually produced content (e.g. to record ingest hashes
+        only for those).
+        """
+        results: List[Tuple[str, List[Document]]] = []
+        if not inputs:
+            return results
+
+        # Parsing and scraping are I/O bound, so load the sources concurrently
+        # and report the results back on the main thread in input order
+        with ThreadPoolExecutor(max_workers=min(8, len(inputs))) as executor:
+            futures = [
+                executor.submit(self._load_single_input, input_path, use_js_rendering, split)
+                for input_path in inputs
+            ]
+
+            for input_path, future in zip(inputs, futures):
+                try:
+                    docs = future.result()
+
+                    if docs is None:
+                        st.warning(f"Unsupported file type: {Path(input_path).suffix.lower()}")
+                        docs = []
+                    elif docs:
+                        if self.is_url(input_path):
+                            method = "JavaScript rendering" if use_js_rendering else "standard"
+                            st.success(f"🌐 Loaded {len(docs)} documents from URL ({method}): {input_path}")
+                        else:
+                            st.success(f"📄 Loaded {len(docs)} documents from file: {input_path}")
+
+                    results.append((input_path, docs))
+
+                except Exception as e:
+                    st.error(f"Error loading {input_path}: {str(e)}")
+                    results.append((input_path, []))
+
+        # Replay warnings/errors the workers queued while loading
+        self._flush_messages()
+        return results
+
+    def load_documents(self, inputs: List[str], use_js_rendering: bool = False,
+                       split: bool = False) -> List[Document]:
+        """Load documents from files or URLs, fetching multiple sources in parallel"""
+        return [doc
+                for _, docs in self.load_documents_by_source(inputs, use_js_rendering, split)
+                for doc in docs]
     
+    # Maximum characters per chunk (~500 tokens). Oversized paragraphs are
+    # subdivided so one huge paragraph can't dominate the context stuffed
+    # into the LLM prompt or skew the overlap scoring.
+    MAX_CHUNK_CHARS = 2000
+
+    # Standard BM25 parameters: k1 controls term-frequency saturation,
+    # b controls document-length normalization.
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+
+    # Maximum number of memoized query() answers kept in memory
+    ANSWER_CACHE_SIZE = 128
+
+    def _split_document(self, doc: Document) -> List[Document]:
+        """Split one document into size-bounded paragraph chunks"""
+        content = doc.page_content
+        # Fast path: documents with no paragraph break that fit one chunk
+        # (cleaned URLs, short pages) pass through with just a chunk index,
+        # skipping the split/loop/re-copy machinery entirely
+        if len(content) <= self.MAX_CHUNK_CHARS and not _PARA_RE.search(content):
+            stripped = content.strip()
+            if not stripped:
+                return []
+            return [Document(page_content=stripped,
+                             metadata={**doc.metadata, "chunk": 0})]
+
+        chunks = []
+        # Copy the source metadata once; per-chunk dicts only add their index
+        base_metadata = dict(doc.metadata)
+        for paragraph in _PARA_RE.split(content):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            for start in range(0, len(paragraph), self.MAX_CHUNK_CHARS):
+                chunks.append(Document(
+                    page_content=paragraph[start:start + self.MAX_CHUNK_CHARS],
+                    metadata={**base_metadata, "chunk": len(chunks)}
+                ))
+        return chunks
+
     def process_documents(self, documents: List[Document]) -> List[Document]:
         """Process documents by splitting into chunks"""
         if not documents:
             return []
-            
+
         # Simple text splitting
         processed_docs = []
         for doc in documents:
-            # Split by paragraphs
-            paragraphs = doc.page_content.split('\n\n')
-            for i, paragraph in enumerate(paragraphs):
-                if paragraph.strip():
-                    processed_docs.append(Document(
-                        page_content=paragraph.strip(),
-                        metadata={**doc.metadata, "chunk": i}
-                    ))
-        
+            processed_docs.extend(self._split_document(doc))
+
         st.info(f"Split documents into {len(processed_docs)} chunks")
         return processed_docs
     
@@ -316,11 +733,33 @@ class SimpleRAGSystem:
             st.warning("No documents to process")
             return
             
-        self.documents = documents
-        st.success(f"Created knowledge base with {len(documents)} document chunks")
-        
-        # Initialize LLM
+        # Extend rather than replace so incremental builds keep prior chunks.
+        # Tokenize each new chunk once here so queries never re-run the regex
+        # over the whole corpus. Exact-duplicate chunks (overlapping URLs and
+        # PDFs are common in support corpora) are dropped before they can
+        # bloat the index and waste scoring work.
+        with self.build_lock:
+            self._ensure_index()  # Re-sync dedupe state if documents were reset
+            doc_id = len(self.documents)
+            for doc in documents:
+                digest = self._chunk_digest(doc.page_content)
+                if digest in self._chunk_hashes:
+                    continue
+                self._chunk_hashes.add(digest)
+                self.documents.append(doc)
+                self._index_document(doc_id, doc.page_content)
+                doc_id += 1
+            # New material can change any answer or context, so drop memoized ones
+            self._answer_cache.clear()
+            self._context_cache.clear()
+        st.success(f"Created knowledge base with {len(self.documents)} document chunks")
+
+        # Initialize LLM. Skipped entirely when a shared client was injected
+        # or on incremental builds that already have one.
+        if self.openai_client is not None or self.llm is not None:
+            return
         try:
+            from langchain_openai import AzureChatOpenAI  # Azure OpenAI integration
             self.llm = AzureChatOpenAI(
                 openai_api_key=AzureConfig.OPENAI_API_KEY,
                 azure_endpoint=AzureConfig.OPENAI_ENDPOINT,
@@ -333,34 +772,129 @@ class SimpleRAGSystem:
             st.error(f"Error initializing LLM: {str(e)}")
             raise
     
+    def _index_document(self, doc_id: int, text: str):
+        """Tokenize one chunk and add its term frequencies to the index"""
+        tokens = _tokenize(text)
+        self._doc_lens.append(len(tokens))
+        for token, tf in Counter(tokens).items():
+            postings = self._index.get(token)
+            if postings is None:
+                postings = self._index[token] = array('i')
+            postings.append(doc_id)
+            postings.append(tf)
+
+    @staticmethod
+    def _chunk_digest(text: str) -> bytes:
+        """Short, fast content digest used to spot duplicate chunks"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def _ensure_index(self):
+        """Rebuild the index if documents were assigned out of band"""
+        if len(self._doc_lens) != len(self.documents):
+            self._doc_lens = array('i')
+            self._index = {}
+            self._chunk_hashes = set()
+            for doc_id, doc in enumerate(self.documents):
+                self._index_document(doc_id, doc.page_content)
+                self._chunk_hashes.add(self._chunk_digest(doc.page_content))
+
+    def _bm25_scores(self, query: str, n_docs: int, avgdl: float) -> Dict[int, float]:
+        """Accumulate BM25 scores for one query over the inverted index
+
+        Only chunks containing at least one query token are ever touched,
+        instead of scoring the whole corpus.
+        """
+        k1, b = self.BM25_K1, self.BM25_B
+        scores: Dict[int, float] = {}
+        for word in frozenset(_tokenize(query)):
+            postings = self._index.get(word)
+            if not postings:
+                continue
+            # Rare terms weigh more than ubiquitous ones
+            df = len(postings) // 2
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for i in range(0, len(postings), 2):
+                doc_id = postings[i]
+                tf = postings[i + 1]
+                # Saturating term frequency, normalized by chunk length
+                norm = tf * (k1 + 1) / (tf + k1 * (1 - b + b * self._doc_lens[doc_id] / avgdl))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+        return scores
+
     def find_relevant_documents(self, query: str, k: int = 3) -> List[Document]:
-        """Find relevant documents using simple text matching"""
+        """Find relevant documents using BM25 scoring over the inverted index"""
         if not self.documents:
             return []
-        
-        # Simple keyword matching
-        query_words = set(re.findall(r'\w+', query.lower()))
-        
-        scored_docs = []
-        for doc in self.documents:
-            content_words = set(re.findall(r'\w+', doc.page_content.lower()))
-            # Calculate simple overlap score
-            overlap = len(query_words.intersection(content_words))
-            if overlap > 0:
-                scored_docs.append((overlap, doc))
-        
-        # Sort by score and return top k
-        scored_docs.sort(key=lambda x: x[0], reverse=True)
-        return [doc for _, doc in scored_docs[:k]]
+
+        self._ensure_index()
+        n_docs = len(self.documents)
+        avgdl = (sum(self._doc_lens) / n_docs) or 1.0
+        scores = self._bm25_scores(query, n_docs, avgdl)
+
+        # Select the top k by score; a bounded heap beats sorting every
+        # matched chunk when the corpus grows
+        top = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+        return [self.documents[doc_id] for doc_id, _ in top]
+
+    def batch_find_relevant(self, queries: List[str], k: int = 3) -> List[List[Document]]:
+        """Find relevant documents for many queries in one pass
+
+        Index preparation and corpus statistics are computed once and
+        shared across all queries — useful for evaluation scripts that
+        grade a whole question set against the knowledge base.
+        """
+        if not self.documents or not queries:
+            return [[] for _ in queries]
+
+        self._ensure_index()
+        n_docs = len(self.documents)
+        avgdl = (sum(self._doc_lens) / n_docs) or 1.0
+
+        results = []
+        for query in queries:
+            scores = self._bm25_scores(query, n_docs, avgdl)
+            top = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+            results.append([self.documents[doc_id] for doc_id, _ in top])
+        return results
     
+    def retrieve_context(self, question: str, k: int = 3) -> str:
+        """Return raw knowledge base context for a question without an LLM call
+
+        For callers that assemble their own prompt (e.g. the chat agent);
+        skips the answer-synthesis round-trip that query() performs.
+        """
+        # Repeated questions (after case/whitespace folding) reuse the
+        # assembled context without re-walking the index
+        cache_key = (' '.join(question.lower().split()), k)
+        cached = self._context_cache.get(cache_key)
+        if cached is not None:
+            self._context_cache.move_to_end(cache_key)
+            return cached
+
+        relevant_docs = self.find_relevant_documents(question, k=k)
+        context = "\n\n".join(doc.page_content for doc in relevant_docs)
+
+        self._context_cache[cache_key] = context
+        if len(self._context_cache) > self.ANSWER_CACHE_SIZE:
+            self._context_cache.popitem(last=False)
+        return context
+
     def query(self, question: str) -> Dict[str, Any]:
         """Query the RAG system"""
-        if not self.llm or not self.documents:
+        if (self.openai_client is None and self.llm is None) or not self.documents:
             return {
                 "answer": "RAG system not initialized. Please upload documents first.",
                 "source_documents": []
             }
         
+        # Repeated questions (exact match after whitespace/case folding) are
+        # answered from the LRU cache without retrieval or an LLM round-trip
+        cache_key = ' '.join(question.lower().split())
+        cached = self._answer_cache.get(cache_key)
+        if cached is not None:
+            self._answer_cache.move_to_end(cache_key)
+            return dict(cached)
+
         try:
             # Find relevant documents
             relevant_docs = self.find_relevant_documents(question, k=3)
@@ -371,8 +905,9 @@ class SimpleRAGSystem:
                     "source_documents": []
                 }
             
-            # Create context from relevant documents
-            context = "\n\n".join([doc.page_content for doc in relevant_docs])
+            # Create context from relevant documents; str.join consumes the
+            # generator directly without building an intermediate list
+            context = "\n\n".join(doc.page_content for doc in relevant_docs)
             
             # Create prompt
             prompt = f"""Based on the following information from the knowledge base, answer the question.
@@ -384,15 +919,29 @@ Question: {question}
 
 Please provide a helpful and accurate answer based on the information above. If the information doesn't directly answer the question, say so and provide what information is available."""
 
-            # Get response from LLM
-            response = self.llm.invoke(prompt)
-            answer = response.content if hasattr(response, 'content') else str(response)
+            # Get response from the shared client (one connection pool for
+            # chat and RAG) or the standalone LangChain fallback
+            if self.openai_client is not None:
+                completion = self.openai_client.chat.completions.create(
+                    model=AzureConfig.OPENAI_DEPLOYMENT,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.7
+                )
+                answer = completion.choices[0].message.content
+            else:
+                response = self.llm.invoke(prompt)
+                answer = response.content if hasattr(response, 'content') else str(response)
             
-            return {
+            result = {
                 "answer": answer,
                 "source_documents": relevant_docs
             }
-            
+            # Only successful answers are memoized; errors stay retryable
+            self._answer_cache[cache_key] = result
+            if len(self._answer_cache) > self.ANSWER_CACHE_SIZE:
+                self._answer_cache.popitem(last=False)
+            return dict(result)
+
         except Exception as e:
             return {
                 "answer": f"Error querying RAG system: {str(e)}",
@@ -401,8 +950,22 @@ Please provide a helpful and accurate answer based on the information above. If
     
     def clear_knowledge_base(self):
         """Clear the knowledge base"""
-        self.documents = []
-        self.llm = None
+        with self.build_lock:
+            self.documents = []
+            self._doc_lens = array('i')
+            self._index = {}
+            self._chunk_hashes = set()
+            self.indexed_hashes = set()
+            self.llm = None
+            self._answer_cache.clear()
+            self._context_cache.clear()
+        with self._selenium_lock:
+            self._close_selenium_driver()
+        try:
+            with self._url_cache_lock, shelve.open(self.URL_CACHE_PATH) as cache:
+                cache.clear()
+        except Exception:
+            pass  # Cache may not exist or be writable; nothing to clear
         st.success("Knowledge base cleared")
     
     def get_stats(self) -> Dict[str, Any]:
@@ -2,18 +2,40 @@
 import azure.cognitiveservices.speech as speechsdk  # Azure Speech Services for voice recognition and synthesis
 from openai import AzureOpenAI  # Azure OpenAI client for GPT-4 integration
 from config import AzureConfig  # Configuration management for Azure services
+import hashlib  # Content hashing for ingest deduplication
+import io  # In-memory buffers for assembling audio data
+from collections import OrderedDict  # LRU cache of synthesized audio
+import queue  # Thread-safe handoff of sentences to the TTS worker
 import time  # For timing operations and delays
 import threading  # For handling concurrent operations
-from typing import List, Dict, Any  # Type hints for better code documentation
-from simple_rag import SimpleRAGSystem  # Custom RAG system for document-based responses
-
-class SupportAgent:
-    """AI Support Agent using Azure Speech and OpenAI services
-    
-    This class integrates Azure Speech Services for voice input/output and Azure OpenAI
-    for conversational AI, with an optional RAG system for document-based knowledge retrieval.
+import wave  # WAV container assembly for streamed PCM audio
+from typing import Iterator, List, Dict, Any, Sequence, Tuple  # Type hints for better code documentation
+# Note: simple_rag (and its document-processing dependencies) is imported
+# lazily via the rag_system property, so RAG-off sessions never pay for it
+
+# Low-content utterances that never benefit from knowledge base retrieval
+_TRIVIAL_QUERIES = {
+    "hi", "hello", "hey", "thanks", "thank you", "thanks a lot", "ok", "okay",
+    "yes", "no", "yep", "nope", "sure", "great", "cool", "got it", "bye",
+    "goodbye", "good morning", "good afternoon", "good evening", "how are you",
+}
+
+class AgentResources:
+    """Process-wide Azure service handles shared by every session's agent
+
+    Everything here is expensive to build — the OpenAI and Speech SDK
+    clients carry connection pools and auth handshakes, and the RAG system
+    holds the knowledge base — and all of it is safe to share between
+    concurrent sessions. Per-user state (conversation history, RAG toggle,
+    system prompt) deliberately lives on SupportAgent instead, one per
+    session, so sessions can never see each other's conversations.
     """
 
+    # Maximum number of memoized synthesized phrases. Support conversations
+    # repeat a lot of boilerplate ("Is there anything else?"), and a cache
+    # hit replaces a full synthesis round-trip with a dict lookup.
+    TTS_CACHE_SIZE = 256
+
     def __init__(self):
         # Validate that all required Azure configuration is present
         AzureConfig.validate()
@@ -28,6 +50,19 @@ class SupportAgent:
         # Configure text-to-speech voice (e.g., "en-US-JennyNeural")
         self.speech_config.speech_synthesis_voice_name = AzureConfig.VOICE_NAME
 
+        # Recognition timeouts, set once before any recognizer exists:
+        # SpeechConfig changes don't propagate to recognizers already built
+        # from it, and per-call mutation of the shared config would race
+        # between concurrent sessions.
+        self.speech_config.set_property(
+            speechsdk.PropertyId.Speech_SegmentationSilenceTimeoutMs,
+            "500"  # 0.5 seconds of silence before finalizing
+        )
+        self.speech_config.set_property(
+            speechsdk.PropertyId.SpeechServiceConnection_InitialSilenceTimeoutMs,
+            "5000"  # 5 seconds max initial silence
+        )
+
         # Initialize Azure OpenAI client for GPT-4 integration
         self.openai_client = AzureOpenAI(
             api_key=AzureConfig.OPENAI_API_KEY,        # OpenAI API key
@@ -35,8 +70,146 @@ class SupportAgent:
             azure_endpoint=AzureConfig.OPENAI_ENDPOINT  # Azure OpenAI endpoint
         )
 
-        # Initialize RAG (Retrieval-Augmented Generation) system for document-based responses
-        self.rag_system = SimpleRAGSystem()  # Custom RAG implementation
+        # RAG (Retrieval-Augmented Generation) system for document-based
+        # responses, built lazily on first use (see the rag_system property)
+        self._rag_system = None
+        # Version counter for the shared knowledge base, bumped on every
+        # build or clear. The KB is process-wide, so caches of KB-derived
+        # values must key on this rather than any per-session counter.
+        self.kb_version = 0
+
+        # Warm pool of PCM-configured synthesizers for sentence-chunked TTS,
+        # so each sentence doesn't pay synthesizer construction + handshake
+        self.pcm_synthesizer_pool: "queue.Queue" = queue.Queue()
+
+        # Long-lived synthesizers and mic recognizer, built lazily and
+        # reused across calls: constructing one triggers authentication and
+        # connection setup worth hundreds of milliseconds per invocation
+        self.tts_synthesizer = None      # Returns audio bytes
+        self.speaker_synthesizer = None  # Plays through the default speaker
+        self.mic_recognizer = None       # One-shot microphone recognition
+        self.tts_lock = threading.Lock() # Synthesizer calls are not re-entrant
+
+        # LRU cache of synthesized audio keyed by (format, text); shared by
+        # the whole-blob and sentence-PCM paths
+        self.tts_cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+        # Pre-warm the service connections in the background so the first
+        # user turn starts from steady state instead of paying TLS and
+        # WebSocket setup for OpenAI and TTS
+        threading.Thread(target=self._warmup, daemon=True).start()
+
+    def _warmup(self):
+        """Open the OpenAI and TTS connections before the first turn
+
+        Runs on a daemon thread at construction. Every step is best-effort:
+        a failure just means the first real call pays the setup cost, as it
+        always did.
+        """
+        try:
+            # Minimal completion forces the TLS handshake and auth; the
+            # pooled connection is then reused by the first real turn
+            self.openai_client.chat.completions.create(
+                model=AzureConfig.OPENAI_DEPLOYMENT,
+                messages=[{"role": "user", "content": "hi"}],
+                max_tokens=1
+            )
+        except Exception:
+            pass
+
+        try:
+            # Build one PCM synthesizer and open its connection without
+            # synthesizing anything, then park it in the warm pool
+            synthesizer = self.acquire_pcm_synthesizer()
+            try:
+                connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+                connection.open(True)  # Pre-connect for later synthesis
+            finally:
+                self.release_pcm_synthesizer(synthesizer)
+        except Exception:
+            pass
+
+    @property
+    def rag_system(self):
+        """The RAG system, constructed on first access
+
+        simple_rag pulls in the document-processing stack (PyPDF2, docx,
+        BeautifulSoup, LangChain schemas), so defer the import until a RAG
+        feature is actually used; sessions that never enable RAG skip the
+        import cost and memory entirely.
+        """
+        if self._rag_system is None:
+            from simple_rag import SimpleRAGSystem  # Custom RAG system for document-based responses
+            # Share the agent's OpenAI client so both use one connection pool
+            self._rag_system = SimpleRAGSystem(openai_client=self.openai_client)
+        return self._rag_system
+
+    def acquire_pcm_synthesizer(self) -> speechsdk.SpeechSynthesizer:
+        """Take a warm PCM synthesizer from the pool, building one if empty
+
+        A pooled synthesizer keeps its connection to the speech service
+        alive, so repeat sentences skip the per-call TLS handshake.
+        """
+        try:
+            return self.pcm_synthesizer_pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        speech_config = speechsdk.SpeechConfig(
+            subscription=AzureConfig.SPEECH_KEY,
+            region=AzureConfig.SPEECH_REGION
+        )
+        speech_config.speech_synthesis_voice_name = AzureConfig.VOICE_NAME
+        speech_config.set_speech_synthesis_output_format(
+            speechsdk.SpeechSynthesisOutputFormat.Raw16Khz16BitMonoPcm
+        )
+
+        return speechsdk.SpeechSynthesizer(
+            speech_config=speech_config,
+            audio_config=None  # No audio output config = return audio data
+        )
+
+    def release_pcm_synthesizer(self, synthesizer: speechsdk.SpeechSynthesizer):
+        """Return a synthesizer to the warm pool for reuse"""
+        self.pcm_synthesizer_pool.put_nowait(synthesizer)
+
+    def tts_cache_get(self, key: Tuple[str, str]) -> bytes:
+        """Look up memoized audio, refreshing its LRU position"""
+        cached = self.tts_cache.get(key)
+        if cached is not None:
+            self.tts_cache.move_to_end(key)
+        return cached
+
+    def tts_cache_put(self, key: Tuple[str, str], audio: bytes):
+        """Memoize synthesized audio, evicting the least recently used"""
+        self.tts_cache[key] = audio
+        if len(self.tts_cache) > self.TTS_CACHE_SIZE:
+            self.tts_cache.popitem(last=False)
+
+
+class SupportAgent:
+    """AI Support Agent using Azure Speech and OpenAI services
+
+    This class integrates Azure Speech Services for voice input/output and Azure OpenAI
+    for conversational AI, with an optional RAG system for document-based knowledge retrieval.
+
+    One agent is constructed per session; the expensive Azure handles live
+    in an AgentResources instance that can be shared between agents, while
+    the conversation history, RAG toggle, and system prompt stay private to
+    each agent.
+    """
+
+    # Token budget for the history sent per turn. Without a cap the prompt
+    # grows every turn, so latency and token spend climb for the whole
+    # session — a real problem for a voice agent that needs quick replies.
+    HISTORY_TOKEN_BUDGET = 2000
+
+    def __init__(self, resources: AgentResources = None):
+        # Shared Azure handles. The Streamlit app passes one process-wide
+        # AgentResources to every session's agent; standalone callers get
+        # their own.
+        self.resources = resources if resources is not None else AgentResources()
+
         self.use_rag = False  # Flag to enable/disable RAG functionality
 
         # Conversation management - Store chat history for context
@@ -44,29 +217,47 @@ class SupportAgent:
         # System prompt that defines the AI's role and behavior
         self.system_prompt = """You are a helpful AI call agent. You assist customers with their inquiries in a professional and friendly manner.
 Keep your responses concise and clear, suitable for spoken conversation."""
-        
+
+        # Tokenizer for history budgeting, loaded lazily on first turn;
+        # False marks tiktoken unavailable (character estimate is used)
+        self._encoder = None
+
         # Speech recognition state variables for real-time voice processing
         self.recognized_text = ""  # Final recognized text from speech
         self.partial_text = ""     # Real-time partial recognition results
+        self.partial_queue = queue.Queue()  # Partial results streamed from recognizer callbacks
         self.is_recognizing = False  # Flag indicating if recognition is active
         self.recognition_done = threading.Event()  # Threading event for synchronization
 
+    @property
+    def speech_config(self) -> speechsdk.SpeechConfig:
+        """The shared speech configuration (see AgentResources)"""
+        return self.resources.speech_config
+
+    @property
+    def openai_client(self) -> AzureOpenAI:
+        """The shared Azure OpenAI client (see AgentResources)"""
+        return self.resources.openai_client
+
+    @property
+    def rag_system(self):
+        """The shared RAG system, constructed on first access"""
+        return self.resources.rag_system
+
+    @property
+    def kb_version(self) -> int:
+        """Version counter of the shared knowledge base (see AgentResources)"""
+        return self.resources.kb_version
+
     def start_continuous_recognition(self) -> speechsdk.SpeechRecognizer:
         """Start continuous speech recognition with real-time transcription"""
         self.recognized_text = ""
+        self.partial_queue = queue.Queue()  # Fresh stream of partials for this session
         self.is_recognizing = True
         self.recognition_done.clear()
-        
-        # Configure for faster, more responsive recognition
-        self.speech_config.set_property(
-            speechsdk.PropertyId.Speech_SegmentationSilenceTimeoutMs, 
-            "500"  # 0.5 seconds of silence before finalizing
-        )
-        self.speech_config.set_property(
-            speechsdk.PropertyId.SpeechServiceConnection_InitialSilenceTimeoutMs,
-            "5000"  # 5 seconds max initial silence
-        )
-        
+
+        # The fast-response timeouts are baked into speech_config at
+        # construction time (see __init__), so no per-call mutation here
         audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
         recognizer = speechsdk.SpeechRecognizer(
             speech_config=self.speech_config,
@@ -87,8 +278,8 @@ Keep your responses concise and clear, suitable for spoken conversation."""
             if evt.result.reason == speechsdk.ResultReason.RecognizingSpeech:
                 # This gives us real-time partial results
                 print(f"Recognizing: {evt.result.text}")
-                # Store partial result for real-time display (don't add to final text)
-                self.partial_text = evt.result.text
+                # Stream partial result to the UI poller (don't add to final text)
+                self.partial_queue.put_nowait(evt.result.text)
         
         def canceled_cb(evt):
             """Callback when recognition is canceled"""
@@ -126,7 +317,20 @@ Keep your responses concise and clear, suitable for spoken conversation."""
         return result
     
     def get_current_transcription(self) -> str:
-        """Get current transcription (final + partial) for real-time display"""
+        """Get current transcription (final + partial) for real-time display
+
+        Drains the partial-result queue without blocking, so the UI poller
+        never contends with the recognizer callback thread.
+        """
+        latest_partial = None
+        while True:
+            try:
+                latest_partial = self.partial_queue.get_nowait()
+            except queue.Empty:
+                break
+        if latest_partial is not None:
+            self.partial_text = latest_partial
+
         final = self.recognized_text.strip()
         partial = self.partial_text.strip()
         
@@ -149,14 +353,15 @@ Keep your responses concise and clear, suitable for spoken conversation."""
         Returns:
             Recognized text or empty string if no speech detected
         """
-        audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
-        recognizer = speechsdk.SpeechRecognizer(
-            speech_config=self.speech_config,
-            audio_config=audio_config
-        )
+        if self.resources.mic_recognizer is None:
+            audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
+            self.resources.mic_recognizer = speechsdk.SpeechRecognizer(
+                speech_config=self.speech_config,
+                audio_config=audio_config
+            )
 
         print(f"Listening... (will auto-stop after {timeout_seconds} seconds of silence)")
-        result = recognizer.recognize_once_async().get()
+        result = self.resources.mic_recognizer.recognize_once_async().get()
 
         if result.reason == speechsdk.ResultReason.RecognizedSpeech:
             return result.text
@@ -173,18 +378,23 @@ Keep your responses concise and clear, suitable for spoken conversation."""
 
     def recognize_speech_from_audio(self, audio_data: bytes, format: str = "wav") -> str:
         """Recognize speech from audio data"""
-        # Create a push stream for the audio data
+        # Start recognition before feeding the stream, so the SDK's
+        # connection setup and the audio upload overlap instead of
+        # serializing write -> close -> connect -> recognize
         stream = speechsdk.audio.PushAudioInputStream()
-        stream.write(audio_data)
-        stream.close()
-
         audio_config = speechsdk.audio.AudioConfig(stream=stream)
         recognizer = speechsdk.SpeechRecognizer(
             speech_config=self.speech_config,
             audio_config=audio_config
         )
+        result_future = recognizer.recognize_once_async()
 
-        result = recognizer.recognize_once_async().get()
+        # Push the audio in chunks while recognition is already under way
+        for start in range(0, len(audio_data), 4096):
+            stream.write(audio_data[start:start + 4096])
+        stream.close()
+
+        result = result_future.get()
 
         if result.reason == speechsdk.ResultReason.RecognizedSpeech:
             return result.text
@@ -196,40 +406,99 @@ Keep your responses concise and clear, suitable for spoken conversation."""
 
         return ""
 
-    def generate_response(self, user_input: str) -> str:
-        """Generate AI response using Azure OpenAI with optional RAG"""
+    def _is_trivial_query(self, user_input: str) -> bool:
+        """Heuristic for low-content turns (greetings, acknowledgements)
+
+        These never benefit from knowledge base retrieval, so the scoring
+        pass and enlarged prompt are skipped for them.
+        """
+        normalized = user_input.lower().strip(" .!?,")
+        return not normalized or normalized in _TRIVIAL_QUERIES
+
+    def _count_tokens(self, text: str) -> int:
+        """Count (or estimate) the tokens in a piece of message text"""
+        if self._encoder is None:
+            try:
+                import tiktoken  # Deferred: only needed once a turn happens
+                self._encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoder = False
+        if self._encoder:
+            return len(self._encoder.encode(text))
+        # Rough heuristic when tiktoken is unavailable: ~4 chars per token
+        return len(text) // 4 + 1
+
+    def _trimmed_history(self) -> List[Dict[str, str]]:
+        """The most recent turns that fit the token budget, oldest dropped
+
+        Only the history *sent* to the model is windowed; the stored
+        conversation stays complete for display and export. The latest
+        message is always kept even if it alone exceeds the budget.
+        """
+        budget = self.HISTORY_TOKEN_BUDGET
+        kept: List[Dict[str, str]] = []
+        for message in reversed(self.conversation_history):
+            budget -= self._count_tokens(message["content"])
+            if budget < 0 and kept:
+                break
+            kept.append(message)
+        kept.reverse()
+        return kept
+
+    def _prepare_messages(self, user_input: str) -> List[Dict[str, str]]:
+        """Record the user turn and assemble the message list for the LLM call
+
+        Builds the system prompt (enhanced with RAG context when a knowledge
+        base is active) followed by the full conversation history.
+        """
         # Add user message to history
         self.conversation_history.append({
             "role": "user",
             "content": user_input
         })
 
-        # Check if RAG is enabled and has knowledge base
-        if self.use_rag and self.rag_system.documents:
+        # Check if RAG is enabled and has knowledge base (without forcing
+        # the lazy RAG construction when none was ever built). Trivial
+        # turns like greetings skip retrieval and prompt stuffing entirely.
+        context_message = None
+        if (self.use_rag and self.resources._rag_system is not None and self.rag_system.documents
+                and not self._is_trivial_query(user_input)):
             try:
-                # Query RAG system for relevant information
-                rag_result = self.rag_system.query(user_input)
-                rag_answer = rag_result["answer"]
-                source_docs = rag_result["source_documents"]
-                
-                # Create enhanced system prompt with RAG context
-                enhanced_prompt = f"""{self.system_prompt}
-
-Based on the knowledge base, here's relevant information:
-{rag_answer}
+                # Stuff the retrieved context straight into the chat prompt.
+                # Going through rag_system.query() here would spend a whole
+                # extra LLM round-trip pre-synthesizing an answer that the
+                # chat call below rewrites anyway.
+                context = self.rag_system.retrieve_context(user_input)
+
+                if context:
+                    context_message = {
+                        "role": "system",
+                        "content": f"""Based on the knowledge base, here's relevant information:
+{context}
 
 Use this information to provide a helpful and accurate response. If the information doesn't directly answer the question, use your general knowledge to provide a helpful response."""
-                
+                    }
+
             except Exception as e:
                 # Fallback to regular response if RAG fails
-                enhanced_prompt = f"{self.system_prompt}\n\nNote: Knowledge base search failed, using general knowledge."
-        else:
-            enhanced_prompt = self.system_prompt
+                context_message = {
+                    "role": "system",
+                    "content": "Note: Knowledge base search failed, using general knowledge."
+                }
+
+        # Prepare messages for API call. The static system prompt goes
+        # first, byte-identical every turn, so the service's prompt cache
+        # can reuse its prefill; per-turn RAG context rides in a separate
+        # system message that never perturbs that prefix. Older turns are
+        # windowed so the prompt stays bounded as the session grows.
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if context_message is not None:
+            messages.append(context_message)
+        return messages + self._trimmed_history()
 
-        # Prepare messages for API call
-        messages = [
-            {"role": "system", "content": enhanced_prompt}
-        ] + self.conversation_history
+    def generate_response(self, user_input: str) -> str:
+        """Generate AI response using Azure OpenAI with optional RAG"""
+        messages = self._prepare_messages(user_input)
 
         # Call Azure OpenAI
         response = self.openai_client.chat.completions.create(
@@ -249,16 +518,132 @@ Use this information to provide a helpful and accurate response. If the informat
 
         return assistant_message
 
-    def text_to_speech(self, text: str) -> bytes:
-        """Convert text to speech and return audio data"""
-        synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=self.speech_config,
-            audio_config=None  # No audio output config = return audio data
+    def generate_response_stream(self, user_input: str) -> Iterator[str]:
+        """Generate AI response as a stream of text deltas
+
+        Same behavior as generate_response (history, RAG) but yields tokens
+        as Azure OpenAI produces them, so callers can overlap downstream work
+        (display, speech synthesis) with generation.
+        """
+        messages = self._prepare_messages(user_input)
+
+        # Call Azure OpenAI in streaming mode
+        stream = self.openai_client.chat.completions.create(
+            model=AzureConfig.OPENAI_DEPLOYMENT,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
         )
 
-        result = synthesizer.speak_text_async(text).get()
+        collected: List[str] = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                delta = chunk.choices[0].delta.content
+                collected.append(delta)
+                yield delta
+
+        # Add assistant response to history once the stream is complete
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": "".join(collected)
+        })
+
+    def _synthesize_sentence_pcm(self, text: str) -> bytes:
+        """Convert one sentence to raw 16 kHz 16-bit mono PCM audio data
+
+        Raw PCM chunks (unlike per-call WAV blobs) can be concatenated into a
+        single valid WAV container afterwards. Repeated sentences are served
+        from the audio cache without a synthesis round-trip.
+        """
+        cached = self.resources.tts_cache_get(("pcm", text))
+        if cached is not None:
+            return cached
+
+        synthesizer = self.resources.acquire_pcm_synthesizer()
+        try:
+            result = synthesizer.speak_text_async(text).get()
+        finally:
+            self.resources.release_pcm_synthesizer(synthesizer)
 
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            self.resources.tts_cache_put(("pcm", text), result.audio_data)
+            return result.audio_data
+        return b""
+
+    def generate_response_with_speech(self, user_input: str) -> Tuple[str, bytes]:
+        """Generate a response and synthesize its speech concurrently
+
+        Streams tokens from the LLM and hands completed sentences to a
+        background TTS worker as they arrive, so synthesis overlaps
+        generation instead of starting after the full response. Returns the
+        response text and a single WAV blob of the stitched audio.
+        """
+        sentence_queue: "queue.Queue" = queue.Queue()
+        audio_parts: List[bytes] = []
+
+        def synthesize_worker():
+            """Drain sentences off the queue and synthesize them in order"""
+            while True:
+                sentence = sentence_queue.get()
+                if sentence is None:
+                    break
+                try:
+                    audio_parts.append(self._synthesize_sentence_pcm(sentence))
+                except Exception as e:
+                    print(f"Sentence synthesis failed: {e}")
+
+        worker = threading.Thread(target=synthesize_worker, daemon=True)
+        worker.start()
+
+        # Stream tokens, flushing complete sentences to the TTS worker.
+        # The finally block guarantees the worker is signalled and joined
+        # even when the stream raises mid-response; otherwise every failed
+        # turn would leak a thread blocked on the queue forever.
+        buffer = ""
+        collected: List[str] = []
+        try:
+            for delta in self.generate_response_stream(user_input):
+                collected.append(delta)
+                buffer += delta
+                stripped = buffer.strip()
+                if stripped and stripped.endswith(('.', '!', '?')):
+                    sentence_queue.put(stripped)
+                    buffer = ""
+        finally:
+            # Flush any trailing fragment and signal the worker to finish
+            if buffer.strip():
+                sentence_queue.put(buffer.strip())
+            sentence_queue.put(None)
+            worker.join()
+
+        # Wrap the concatenated PCM chunks in a single WAV container
+        wav_buffer = io.BytesIO()
+        with wave.open(wav_buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)   # Mono
+            wav_file.setsampwidth(2)   # 16-bit samples
+            wav_file.setframerate(16000)
+            wav_file.writeframes(b"".join(audio_parts))
+
+        return "".join(collected), wav_buffer.getvalue()
+
+    def text_to_speech(self, text: str) -> bytes:
+        """Convert text to speech and return audio data"""
+        resources = self.resources
+        cached = resources.tts_cache_get(("blob", text))
+        if cached is not None:
+            return cached
+
+        with resources.tts_lock:
+            if resources.tts_synthesizer is None:
+                resources.tts_synthesizer = speechsdk.SpeechSynthesizer(
+                    speech_config=self.speech_config,
+                    audio_config=None  # No audio output config = return audio data
+                )
+            result = resources.tts_synthesizer.speak_text_async(text).get()
+
+        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            resources.tts_cache_put(("blob", text), result.audio_data)
             return result.audio_data
         elif result.reason == speechsdk.ResultReason.Canceled:
             cancellation = result.cancellation_details
@@ -268,13 +653,15 @@ Use this information to provide a helpful and accurate response. If the informat
 
     def speak_text(self, text: str):
         """Speak text through default speaker"""
-        audio_config = speechsdk.audio.AudioOutputConfig(use_default_speaker=True)
-        synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=self.speech_config,
-            audio_config=audio_config
-        )
-
-        result = synthesizer.speak_text_async(text).get()
+        resources = self.resources
+        with resources.tts_lock:
+            if resources.speaker_synthesizer is None:
+                audio_config = speechsdk.audio.AudioOutputConfig(use_default_speaker=True)
+                resources.speaker_synthesizer = speechsdk.SpeechSynthesizer(
+                    speech_config=self.speech_config,
+                    audio_config=audio_config
+                )
+            result = resources.speaker_synthesizer.speak_text_async(text).get()
 
         if result.reason == speechsdk.ResultReason.Canceled:
             cancellation = result.cancellation_details
@@ -288,38 +675,154 @@ Use this information to provide a helpful and accurate response. If the informat
         """Update the system prompt"""
         self.system_prompt = prompt
 
-    def get_conversation_history(self) -> List[Dict[str, str]]:
-        """Get the current conversation history"""
-        return self.conversation_history.copy()
+    def get_conversation_history(self) -> Sequence[Dict[str, str]]:
+        """Get the current conversation history
+
+        Returns a live read-only view — callers must not mutate it. The
+        previous per-call list copy scaled with session length, which adds
+        up for UIs that poll the history every rerun.
+        """
+        return self.conversation_history
     
     def enable_rag(self, enabled: bool = True):
         """Enable or disable RAG functionality"""
         self.use_rag = enabled
     
     def setup_rag_knowledge_base(self, file_paths: List[str], force_recreate: bool = False, use_js_rendering: bool = False):
-        """Setup RAG knowledge base from files and URLs"""
+        """Setup RAG knowledge base from files and URLs
+
+        Sources whose content hash is already indexed are skipped, so
+        re-building after adding one file only ingests the new file. Pass
+        force_recreate=True to re-ingest everything from scratch.
+        """
         try:
-            # Load documents
-            documents = self.rag_system.load_documents(file_paths, use_js_rendering=use_js_rendering)
-            if not documents:
-                return False, "No documents loaded"
-            
-            # Process documents
-            processed_docs = self.rag_system.process_documents(documents)
-            
-            # Create knowledge base
-            self.rag_system.create_knowledge_base(processed_docs)
-            
-            return True, f"Knowledge base created with {len(processed_docs)} document chunks"
-            
+            # Hold the shared RAG system's build lock for the whole check/
+            # load/index sequence: the knowledge base is process-wide, and
+            # two sessions building at once would interleave doc ids and
+            # hash bookkeeping
+            with self.rag_system.build_lock:
+                if force_recreate:
+                    self.rag_system.documents = []
+                    self.rag_system.indexed_hashes = set()
+
+                # Skip sources whose content is already in the knowledge base
+                new_paths = []
+                new_hashes = []
+                for path in file_paths:
+                    source_hash = self.rag_system.compute_source_hash(path)
+                    if source_hash is not None and source_hash in self.rag_system.indexed_hashes:
+                        continue
+                    new_paths.append(path)
+                    new_hashes.append(source_hash)
+
+                if not new_paths:
+                    return True, "All documents are already in the knowledge base"
+
+                # Load documents with chunking fused into the load workers, so
+                # the full-document intermediate list is never materialized
+                results = self.rag_system.load_documents_by_source(
+                    new_paths, use_js_rendering=use_js_rendering, split=True
+                )
+                processed_docs = [doc for _, docs in results for doc in docs]
+                if not processed_docs:
+                    return False, "No documents loaded"
+
+                # Create knowledge base and invalidate KB-derived caches
+                self.rag_system.create_knowledge_base(processed_docs)
+                self.resources.kb_version += 1
+
+                # Remember what was ingested so unchanged sources are skipped
+                # next time — but only sources that actually yielded documents,
+                # so a failed file stays retryable on the next build
+                self.rag_system.indexed_hashes.update(
+                    h for h, (_, docs) in zip(new_hashes, results)
+                    if h is not None and docs
+                )
+
+                return True, f"Knowledge base created with {len(processed_docs)} document chunks"
+
         except Exception as e:
             return False, f"Error setting up knowledge base: {str(e)}"
     
+    def setup_rag_knowledge_base_streams(self, files: List[Tuple[str, bytes]], urls: List[str] = None,
+                                         force_recreate: bool = False, use_js_rendering: bool = False):
+        """Setup RAG knowledge base from in-memory uploads and URLs
+
+        files is a list of (name, bytes) pairs straight from the Streamlit
+        uploader, so uploads never take a temp-file round-trip through disk.
+        Content-hash skipping applies as in setup_rag_knowledge_base.
+        """
+        try:
+            # Hold the shared RAG system's build lock for the whole check/
+            # load/index sequence (see setup_rag_knowledge_base)
+            with self.rag_system.build_lock:
+                if force_recreate:
+                    self.rag_system.documents = []
+                    self.rag_system.indexed_hashes = set()
+
+                # Skip sources whose content is already in the knowledge base
+                new_files = []
+                new_file_hashes = []
+                for name, data in (files or []):
+                    source_hash = hashlib.sha256(data).hexdigest()
+                    if source_hash in self.rag_system.indexed_hashes:
+                        continue
+                    new_files.append((name, data))
+                    new_file_hashes.append(source_hash)
+
+                new_urls = []
+                new_url_hashes = []
+                for url in (urls or []):
+                    source_hash = self.rag_system.compute_source_hash(url)
+                    if source_hash is not None and source_hash in self.rag_system.indexed_hashes:
+                        continue
+                    new_urls.append(url)
+                    new_url_hashes.append(source_hash)
+
+                if not new_files and not new_urls:
+                    return True, "All documents are already in the knowledge base"
+
+                # Load documents with chunking fused into the load workers, so
+                # the full-document intermediate list is never materialized
+                results = self.rag_system.load_from_streams_by_name(new_files, split=True)
+                if new_urls:
+                    results.extend(self.rag_system.load_documents_by_source(
+                        new_urls, use_js_rendering=use_js_rendering, split=True
+                    ))
+                processed_docs = [doc for _, docs in results for doc in docs]
+                if not processed_docs:
+                    return False, "No documents loaded"
+
+                # Create knowledge base and invalidate KB-derived caches
+                self.rag_system.create_knowledge_base(processed_docs)
+                self.resources.kb_version += 1
+
+                # Remember what was ingested so unchanged sources are skipped
+                # next time — but only sources that actually yielded documents,
+                # so a failed upload or URL stays retryable on the next build
+                self.rag_system.indexed_hashes.update(
+                    h for h, (_, docs) in zip(new_file_hashes + new_url_hashes, results)
+                    if h is not None and docs
+                )
+
+                return True, f"Knowledge base created with {len(processed_docs)} document chunks"
+
+        except Exception as e:
+            return False, f"Error setting up knowledge base: {str(e)}"
+
     def get_rag_stats(self) -> Dict[str, Any]:
         """Get RAG system statistics"""
+        if self.resources._rag_system is None:
+            # Don't force the lazy import just to report an empty KB
+            return {"total_documents": 0, "status": "Not initialized"}
         return self.rag_system.get_stats()
-    
+
     def clear_rag_knowledge_base(self):
         """Clear the RAG knowledge base"""
-        self.rag_system.clear_knowledge_base()
+        if self.resources._rag_system is not None:
+            # Same build lock as the setup paths, so a clear can't race a
+            # concurrent build on the shared knowledge base
+            with self.rag_system.build_lock:
+                self.rag_system.clear_knowledge_base()
+                self.resources.kb_version += 1
         self.use_rag = False